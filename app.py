@@ -1,7 +1,18 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
-from datetime import datetime
+import asyncio
+import hashlib
+import json
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
 
 # Try to import from config file
 try:
@@ -9,17 +20,73 @@ try:
 except ImportError:
     CONFIG_API_KEY = None
 
+# Optional faster JSON encoder/decoder for request and response bodies
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fixed instruction placed ahead of every message. It must stay byte-identical
+# between calls so Gemini's implicit prefix cache can reuse it.
+STATIC_SYSTEM_PROMPT = (
+    "You are CAD AI, a generative CAD assistant in a web chat. "
+    "Answer clearly and concisely; Markdown formatting is supported."
+)
+
+# config.py may override the system instruction
+try:
+    from config import SYSTEM_INSTRUCTION
+except ImportError:
+    SYSTEM_INSTRUCTION = STATIC_SYSTEM_PROMPT
+
 # Import Google Generative AI SDK
 try:
     from google import genai
+    from google.genai import types
 except ImportError:
     genai = None
+    types = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# Longest chat message accepted, in characters
+MAX_MESSAGE_LENGTH = 8192
+
+# ASCII control characters other than tab, newline and carriage return
+_CTRL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
 
 app = Flask(__name__)
+# Refuse oversized bodies before reading them (allows for JSON escaping of a maximal message)
+app.config['MAX_CONTENT_LENGTH'] = 64 * 1024
+if orjson is not None:
+    app.json = OrjsonProvider(app)  # jsonify and request parsing now go through orjson
 CORS(app)  # Enable CORS for all routes
 
 class GeminiChatbot:
-    def __init__(self, api_key=None):
+    # Exact-match response cache shared by all instances (message + models -> text)
+    _response_cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    cache_size = 1024
+
+    # How long a duplicate request waits for the in-flight call it joined
+    inflight_timeout = 30
+
+    # Models that raised recently, shared by all instances (model -> monotonic deadline)
+    _dead_until = {}
+    model_retry_after = 30
+
+    # Gemini only accepts explicit context caches of at least this many tokens
+    min_context_cache_tokens = 2048
+    context_cache_ttl = 600
+
+    def __init__(self, api_key=None, system_instruction=None):
         if genai is None:
             raise ValueError("google-genai package is required. Install it with: pip install -q -U google-genai")
         
@@ -38,50 +105,352 @@ class GeminiChatbot:
             'gemini-pro'
         ]
         self.current_model = None
+        
+        # Large system instructions are uploaded once as a Gemini context cache per model
+        self.system_instruction = system_instruction or SYSTEM_INSTRUCTION
+        self._context_caches = {}
+        self._context_cache_lock = threading.Lock()
+        self.cached_token_count = 0
+        
+        # Calls currently waiting on the API, so concurrent duplicates can share them
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
     
-    def send_message(self, message):
-        """Send a message to the Gemini API and return the response"""
-        # Try each model until one works
+    def send_message(self, message, no_cache=False):
+        """Send a message to the Gemini API and return the response
+
+        Identical messages are answered from an in-memory LRU cache; pass
+        no_cache=True for prompts that must not be stored or served from it.
+        """
+        if no_cache:
+            return self._send_message_uncached(message)[0]
+
+        key = self._cache_key(message)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        # Join an identical call that is already in flight instead of starting another
+        with self._inflight_lock:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            try:
+                return future.result(timeout=self.inflight_timeout)
+            except FutureTimeoutError:
+                return "Timed out waiting for a response. Please try again."
+
+        try:
+            text, ok = self._send_message_uncached(message)
+            if ok:
+                self._cache_put(key, text)
+            future.set_result(text)
+            return text
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def stream_message(self, message, no_cache=False):
+        """Yield the response to a message in chunks as Gemini generates it
+
+        Cached responses are yielded whole. If streaming fails before any text
+        arrives, the buffered send_message path (with its model fallback) is used.
+        """
+        key = self._cache_key(message)
+        if not no_cache:
+            cached = self._cache_get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        model_name = self._models_to_try()[0]
+        chunks = []
+        try:
+            stream = self.client.models.generate_content_stream(
+                model=model_name,
+                contents=message,
+                config=self._generation_config(model_name)
+            )
+            for chunk in stream:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield chunk.text
+        except Exception:
+            self._mark_dead(model_name)
+            # Text already sent can't be retracted; only fall back before the first chunk
+            if chunks:
+                raise
+
+        if not chunks:
+            yield self.send_message(message, no_cache)
+            return
+
+        self.current_model = model_name
+        if not no_cache:
+            self._cache_put(key, "".join(chunks))
+
+    async def send_message_async(self, message, no_cache=False):
+        """Send a message without blocking the event loop
+
+        The google-genai client used here is synchronous, so the call runs in a
+        worker thread while other requests are served.
+        """
+        return await asyncio.to_thread(self.send_message, message, no_cache)
+
+    def clear_cache(self):
+        """Clear the cached responses"""
+        with self._cache_lock:
+            self._response_cache.clear()
+
+    def send_batch(self, messages):
+        """Answer several messages with a single API call
+
+        Returns the answers in message order, or None if the model's reply
+        could not be split back into one answer per message.
+        """
+        items = "\n".join(f"{i}. {json.dumps(m)}" for i, m in enumerate(messages, 1))
+        prompt = (
+            f"Answer each of the following {len(messages)} user messages independently. "
+            "Reply with only a JSON array of strings containing exactly one answer per "
+            f"message, in the same order.\n{items}"
+        )
+        text, ok = self._send_message_uncached(prompt)
+        if not ok:
+            return None
+
+        # Models often wrap JSON replies in a Markdown code fence
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+        try:
+            answers = json.loads(text)
+        except ValueError:
+            return None
+        if (not isinstance(answers, list) or len(answers) != len(messages)
+                or not all(isinstance(a, str) and a for a in answers)):
+            return None
+        # Answers are not cached: a message in the same prompt can steer the
+        # others, so they must not be served to other requests
+        return answers
+
+    def _cache_get(self, key):
+        """Look up an exact-match cached response"""
+        with self._cache_lock:
+            cached = self._response_cache.get(key)
+            if cached is not None:
+                self._response_cache.move_to_end(key)
+            return cached
+
+    def _cache_put(self, key, text):
+        """Store an exact-match response, evicting the least recently used entries"""
+        with self._cache_lock:
+            self._response_cache[key] = text
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self.cache_size:
+                self._response_cache.popitem(last=False)
+
+    def _cache_key(self, message):
+        """Build the cache key for a message under the current models and instruction"""
+        raw = "\0".join(self.models) + "\0" + (self.system_instruction or "") + "\0" + message
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    def set_system_instruction(self, system_instruction):
+        """Replace the system instruction, dropping context caches built for the old one"""
+        with self._context_cache_lock:
+            self.system_instruction = system_instruction
+            stale = [name for name, _ in self._context_caches.values() if name]
+            self._context_caches.clear()
+        for name in stale:
+            try:
+                self.client.caches.delete(name=name)
+            except Exception:
+                pass
+
+    def _generation_config(self, model_name):
+        """Build the generate_content config carrying the system instruction"""
+        if not self.system_instruction:
+            return None
+        cache_name = self._context_cache_name(model_name)
+        if cache_name:
+            return types.GenerateContentConfig(cached_content=cache_name)
+        return types.GenerateContentConfig(system_instruction=self.system_instruction)
+
+    def _context_cache_name(self, model_name):
+        """Return a live context cache for the system instruction, creating it if worthwhile"""
+        now = time.monotonic()
+        with self._context_cache_lock:
+            entry = self._context_caches.get(model_name)
+            if entry and entry[1] > now:
+                return entry[0]
+            instruction = self.system_instruction
+
+        cache_name = None
+        # Every token spans at least one character, so shorter instructions can't qualify
+        if len(instruction) >= self.min_context_cache_tokens:
+            try:
+                tokens = self.client.models.count_tokens(model=model_name, contents=instruction).total_tokens
+                if tokens and tokens >= self.min_context_cache_tokens:
+                    cached = self.client.caches.create(
+                        model=model_name,
+                        config=types.CreateCachedContentConfig(
+                            system_instruction=instruction,
+                            ttl=f"{self.context_cache_ttl}s"
+                        )
+                    )
+                    cache_name = cached.name
+            except Exception:
+                # Models without caching support fall back to sending the instruction inline
+                cache_name = None
+
+        with self._context_cache_lock:
+            if self.system_instruction == instruction:
+                # Expire our handle a little before the server does
+                self._context_caches[model_name] = (cache_name, now + self.context_cache_ttl - 30)
+        return cache_name
+
+    def _models_to_try(self):
+        """Order the models for a call: last working model first, failing models skipped"""
+        ordered = ([self.current_model] if self.current_model else []) + \
+            [m for m in self.models if m != self.current_model]
+        now = time.monotonic()
+        alive = [m for m in ordered if self._dead_until.get(m, 0) <= now]
+        # If every model failed recently, try them all rather than giving up
+        return alive or ordered
+
+    def _mark_dead(self, model_name):
+        """Skip a failing model for model_retry_after seconds"""
+        self._dead_until[model_name] = time.monotonic() + self.model_retry_after
+
+    def _send_message_uncached(self, message):
+        """Call the API and return (text, ok); ok is False for error messages"""
+        # Try each model until one works, starting with the last one that did
+        models_to_try = self._models_to_try()
         last_error = None
-        for model_name in self.models:
+        for model_name in models_to_try:
             try:
                 # Use the SDK method as shown in documentation
                 response = self.client.models.generate_content(
                     model=model_name,
-                    contents=message
+                    contents=message,
+                    config=self._generation_config(model_name)
                 )
                 
-                # Extract text from response (as shown in docs: response.text)
-                if hasattr(response, 'text') and response.text:
+                # Track how much of the prompt was billed at the cached-token rate
+                try:
+                    self.cached_token_count = response.usage_metadata.cached_content_token_count or 0
+                except AttributeError:
+                    self.cached_token_count = 0
+                
+                # Extract text from response (as shown in docs: response.text),
+                # falling back to the first part of the first candidate
+                try:
+                    text = response.text or response.candidates[0].content.parts[0].text
+                except (AttributeError, IndexError, TypeError):
+                    text = None
+                if text:
                     self.current_model = model_name
-                    return response.text
-                else:
-                    # Fallback: try to extract from candidates if text attribute doesn't exist
-                    if hasattr(response, 'candidates') and len(response.candidates) > 0:
-                        candidate = response.candidates[0]
-                        if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                            parts = candidate.content.parts
-                            if len(parts) > 0 and hasattr(parts[0], 'text'):
-                                self.current_model = model_name
-                                return parts[0].text
-                    
-                    # If we got here but no text, try next model
-                    if model_name != self.models[-1]:
-                        continue
-                    else:
-                        return "Received response but could not extract text content."
+                    return text, True
+                
+                # If we got here but no text, try next model
+                if model_name != models_to_try[-1]:
+                    continue
+                return "Received response but could not extract text content.", False
                     
             except Exception as e:
-                # If this model fails, try the next one
+                # If this model fails, skip it for a while and try the next one
+                self._mark_dead(model_name)
                 error_msg = str(e)
                 last_error = error_msg
-                if model_name != self.models[-1]:
+                if model_name != models_to_try[-1]:
                     continue
                 else:
-                    return f"Error with all models. Last error: {error_msg}"
+                    return f"Error with all models. Last error: {error_msg}", False
         
         # If all models failed, return the last error
-        return last_error or "Unable to generate response from any available model."
+        return last_error or "Unable to generate response from any available model.", False
+
+class BatchCollector:
+    """Groups chat messages that arrive within a short window into one Gemini call"""
+
+    def __init__(self, chatbot, window=0.02, max_batch=16):
+        self.chatbot = chatbot
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_batch)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def submit(self, message):
+        """Queue a message and return a Future resolving to its response"""
+        # Started lazily so the thread belongs to the serving process, not a pre-fork parent
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._collect, daemon=True)
+                self._worker.start()
+        future = Future()
+        self._queue.put((future, message))
+        return future
+
+    def _collect(self):
+        """Drain the queue into batches of at most max_batch messages per window"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        """Answer a batch, falling back to one call per message if needed"""
+        pending = {}
+        for future, message in batch:
+            cached = self.chatbot._cache_get(self.chatbot._cache_key(message))
+            if cached is not None:
+                future.set_result(cached)
+            else:
+                pending.setdefault(message, []).append(future)
+
+        answers = None
+        if len(pending) > 1:
+            try:
+                answers = self.chatbot.send_batch(list(pending))
+            except Exception:
+                answers = None
+
+        if answers is None:
+            for message, futures in pending.items():
+                self._executor.submit(self._answer, message, futures)
+        else:
+            for futures, answer in zip(pending.values(), answers):
+                for future in futures:
+                    future.set_result(answer)
+
+    def _answer(self, message, futures):
+        """Answer a single message and resolve every future waiting on it"""
+        try:
+            response = self.chatbot.send_message(message)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+        else:
+            for future in futures:
+                future.set_result(response)
 
 # Initialize chatbot
 try:
@@ -91,13 +460,66 @@ except ValueError as e:
     print(f"Warning: {e}")
     chatbot_available = False
 
+# Concurrent chat requests are batched within this window (milliseconds).
+# Off by default: batched messages share one prompt and can influence each other.
+BATCH_WINDOW_MS = float(os.getenv('CHAT_BATCH_WINDOW_MS', '0'))
+batcher = BatchCollector(chatbot, window=BATCH_WINDOW_MS / 1000) if chatbot_available and BATCH_WINDOW_MS > 0 else None
+
+# Last whole second seen and its ISO-8601 string, shared by all responses
+_ts_cache = [0, ""]
+
+def now_iso():
+    """Return the current UTC time as ISO-8601, formatted at most once per second"""
+    t = int(time.time())
+    c = _ts_cache
+    if c[0] != t:
+        c[1] = datetime.fromtimestamp(t, timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+        c[0] = t
+    return c[1]
+
 @app.route('/')
 def index():
     """Serve the main chat interface"""
     return render_template('index.html')
 
+def read_chat_message():
+    """Validate the chat request body
+
+    Returns (message, None) on success or (None, error response) otherwise.
+    """
+    try:
+        data = app.json.loads(request.get_data())
+    except RequestEntityTooLarge:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Message is too long'
+        }), 413)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or not isinstance(data.get('message'), str):
+        return None, (jsonify({
+            'success': False,
+            'error': 'Message is required'
+        }), 400)
+    
+    message = data['message']
+    if len(message) > MAX_MESSAGE_LENGTH:
+        return None, (jsonify({
+            'success': False,
+            'error': f'Message cannot exceed {MAX_MESSAGE_LENGTH} characters'
+        }), 400)
+    
+    message = _CTRL.sub('', message.strip())
+    if not message:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Message cannot be empty'
+        }), 400)
+    
+    return message, None
+
 @app.route('/api/chat', methods=['POST'])
-def chat():
+async def chat():
     """Handle chat messages"""
     try:
         if not chatbot_available:
@@ -106,27 +528,20 @@ def chat():
                 'error': 'Chatbot not available. Please check API key configuration.'
             }), 500
         
-        data = request.get_json()
-        if not data or 'message' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Message is required'
-            }), 400
-        
-        message = data['message'].strip()
-        if not message:
-            return jsonify({
-                'success': False,
-                'error': 'Message cannot be empty'
-            }), 400
+        message, error = read_chat_message()
+        if error:
+            return error
         
         # Get response from Gemini
-        response = chatbot.send_message(message)
+        if batcher is not None:
+            response = await asyncio.wrap_future(batcher.submit(message))
+        else:
+            response = await chatbot.send_message_async(message)
         
         return jsonify({
             'success': True,
             'response': response,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso()
         })
         
     except Exception as e:
@@ -135,22 +550,57 @@ def chat():
             'error': f'Internal server error: {str(e)}'
         }), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the chat response as server-sent events while it is generated"""
+    if not chatbot_available:
+        return jsonify({
+            'success': False,
+            'error': 'Chatbot not available. Please check API key configuration.'
+        }), 500
+    
+    message, error = read_chat_message()
+    if error:
+        return error
+    
+    def generate():
+        try:
+            for text in chatbot.stream_message(message):
+                yield f"data: {app.json.dumps({'text': text})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {app.json.dumps({'error': f'Internal server error: {str(e)}'})}\n\n"
+            return
+        yield f"event: done\ndata: {app.json.dumps({'timestamp': now_iso()})}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Probe responses are serialized once. A fresh Response wraps the bytes on each
+# hit because after_request hooks such as CORS add headers to the object.
+_HEALTH_BODY = app.json.dumps({'status': 'healthy'}).encode() + b'\n'
+_status_cache = ["", b""]
+
 @app.route('/api/status')
 def status():
     """Check API status"""
-    return jsonify({
-        'status': 'online',
-        'chatbot_available': chatbot_available,
-        'timestamp': datetime.now().isoformat()
-    })
+    timestamp = now_iso()
+    c = _status_cache
+    if c[0] != timestamp:
+        c[1] = app.json.dumps({
+            'status': 'online',
+            'chatbot_available': chatbot_available,
+            'timestamp': timestamp
+        }).encode() + b'\n'
+        c[0] = timestamp
+    return Response(c[1], mimetype='application/json')
 
 @app.route('/api/health')
 def health():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
-    })
+    return Response(_HEALTH_BODY, mimetype='application/json')
 
 @app.errorhandler(404)
 def not_found(error):
@@ -166,19 +616,26 @@ if __name__ == '__main__':
     
     if chatbot_available:
         print("✅ Gemini API configured successfully!")
-        print("🌐 Starting web server...")
-        print("📱 Open your browser and go to: http://localhost:5000")
     else:
         print("❌ Gemini API not configured!")
         print("Please set your API key in config.py or as environment variable")
         print("🌐 Web server will start but chatbot functionality will be limited")
     
-    print("=" * 50)
-    
-    # Run the Flask app
-    app.run(
-        host='0.0.0.0',
-        port=5000,
-        debug=True,
-        threaded=True
-    )
+    if not os.getenv('FLASK_DEV'):
+        # The development server is single-process; production traffic goes through gunicorn
+        print("🚀 Serve the app with gunicorn and gevent workers:")
+        print("   gunicorn -k gevent -w 4 --worker-connections 1000 -b 0.0.0.0:5000 wsgi:application")
+        print("🛠️  Or set FLASK_DEV=1 to run the Flask development server")
+        print("=" * 50)
+    else:
+        print("🌐 Starting development web server...")
+        print("📱 Open your browser and go to: http://localhost:5000")
+        print("=" * 50)
+        
+        # Run the Flask app
+        app.run(
+            host='0.0.0.0',
+            port=5000,
+            debug=True,
+            threaded=True
+        )
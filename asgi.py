@@ -0,0 +1,10 @@
+# ASGI entry point for event-loop servers
+# Run with: hypercorn -k uvloop -w 4 -b 0.0.0.0:5000 asgi:asgi_app
+#
+# Kept apart from wsgi.py, whose gevent monkey-patching must not be applied
+# under an asyncio server.
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+
+asgi_app = WsgiToAsgi(app)
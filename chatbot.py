@@ -1,7 +1,46 @@
-import requests
+import asyncio
+import functools
+import httpx
 import json
 import os
-from typing import Optional
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from typing import List, Optional, Sequence, Tuple
+
+# Optional faster JSON encoder for request bodies
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional persistent cache shared across restarts
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+# Optional vectorized similarity search for the semantic cache
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Optional local sentence-embedding model (ONNX export of all-MiniLM-L6-v2) for the
+# semantic cache: a directory holding model.onnx and tokenizer.json. Without it,
+# or without onnxruntime/tokenizers installed, prompts are embedded by the API.
+EMBED_MODEL_DIR = os.getenv('GEMINI_EMBED_MODEL_DIR', 'minilm')
+
+# Fixed instruction at the start of every request. It must stay byte-identical
+# between calls so Gemini's implicit prefix cache can reuse it.
+STATIC_SYSTEM_PROMPT = (
+    "You are a helpful AI assistant chatting with a user in a terminal. "
+    "Answer clearly and concisely, using plain text rather than Markdown."
+)
 
 # Try to import from config file
 try:
@@ -9,98 +48,661 @@ try:
 except ImportError:
     CONFIG_API_KEY = None
 
+@functools.lru_cache(maxsize=1)
+def _embedder():
+    """
+    Load the local embedding model once per process, shared by all threads
+    
+    Returns:
+        An (onnxruntime session, tokenizer) pair, or None if it is unavailable
+    """
+    model_path = os.path.join(EMBED_MODEL_DIR, 'model.onnx')
+    tokenizer_path = os.path.join(EMBED_MODEL_DIR, 'tokenizer.json')
+    if not (os.path.isfile(model_path) and os.path.isfile(tokenizer_path)):
+        return None
+    try:
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+    except ImportError:
+        return None
+
+    try:
+        session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        tokenizer = Tokenizer.from_file(tokenizer_path)
+        tokenizer.enable_truncation(max_length=256)
+    except Exception:
+        # A corrupt or incompatible export falls back to the API embedder
+        return None
+    return session, tokenizer
+
+def _local_embed(text: str) -> Optional[List[float]]:
+    """Embed text with the local model (mean-pooled token states), or None if unavailable or failing"""
+    loaded = _embedder()
+    if loaded is None or np is None:
+        return None
+
+    session, tokenizer = loaded
+    try:
+        encoding = tokenizer.encode(text)
+        input_ids = np.array([encoding.ids], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if any(i.name == "token_type_ids" for i in session.get_inputs()):
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = session.run(None, feeds)[0]
+        pooled = (hidden * attention_mask[..., None]).sum(axis=1) / attention_mask.sum()
+        return pooled[0].tolist()
+    except Exception:
+        return None
+
+class SemanticCache:
+    """
+    Embedding-similarity response cache backed by SQLite
+
+    Prompts are stored as unit-normalised float32 vectors so a lookup is a
+    dot product against the live entries of one namespace, computed as a
+    single matrix-vector product when numpy is installed.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Args:
+            path: SQLite database file; the default keeps the cache in memory
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache ("
+            "namespace TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "response TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS semantic_cache_ns ON semantic_cache (namespace)"
+        )
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> array:
+        vector = array('f', embedding)
+        norm = math.sqrt(sum(x * x for x in vector))
+        if norm:
+            for i in range(len(vector)):
+                vector[i] /= norm
+        return vector
+
+    def query(self, namespace: str, embedding: Sequence[float], top_k: int = 1) -> List[Tuple[float, str]]:
+        """
+        Find the cached responses whose prompts are most similar to an embedding
+        
+        Returns:
+            Up to top_k (cosine similarity, response) pairs, best first
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            # Entries from an embedder of another dimension are skipped in SQL
+            rows = self._conn.execute(
+                "SELECT embedding, response FROM semantic_cache "
+                "WHERE namespace = ? AND expires_at > ? AND length(embedding) = ?",
+                (namespace, time.time(), len(vector) * vector.itemsize)
+            ).fetchall()
+        if not rows:
+            return []
+
+        if np is not None:
+            matrix = np.frombuffer(b"".join(blob for blob, _ in rows), dtype=np.float32)
+            scores = matrix.reshape(len(rows), len(vector)) @ np.frombuffer(vector, dtype=np.float32)
+            best = np.argsort(scores)[::-1][:top_k]
+            return [(float(scores[i]), rows[i][1]) for i in best]
+
+        scored = []
+        for blob, response in rows:
+            stored = array('f')
+            stored.frombytes(blob)
+            scored.append((sum(a * b for a, b in zip(vector, stored)), response))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:top_k]
+
+    def insert(self, namespace: str, embedding: Sequence[float], response: str, ttl: float = 3600):
+        """Store a response under a prompt embedding for ttl seconds"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM semantic_cache WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "INSERT INTO semantic_cache (namespace, embedding, response, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, self._normalize(embedding).tobytes(), response, now + ttl)
+            )
+
+    def clear(self, namespace: Optional[str] = None):
+        """Remove all entries, or only those of one namespace"""
+        with self._lock, self._conn:
+            if namespace is None:
+                self._conn.execute("DELETE FROM semantic_cache")
+            else:
+                self._conn.execute("DELETE FROM semantic_cache WHERE namespace = ?", (namespace,))
+
 class GeminiChatbot:
-    def __init__(self, api_key: Optional[str] = None):
+    # Exact-match response cache shared by all instances (conversation state -> text)
+    _response_cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    cache_size = 1024
+
+    # Paraphrased prompts are answered from the semantic cache above this cosine similarity
+    similarity_threshold = 0.95
+    semantic_cache_ttl = 3600
+    disk_cache_ttl = 86400
+
+    # History is capped at this many entries; the oldest are folded into a summary
+    history_limit = 50
+    summary_batch = 10
+    max_turn_chars = 4096
+
+    # Transient statuses retried with exponential backoff
+    retry_statuses = (429, 500, 502, 503, 504)
+    max_retries = 2
+    retry_backoff = 0.3
+
+    def __init__(self, api_key: Optional[str] = None, semantic_cache: Optional[SemanticCache] = None,
+                 cache_dir: Optional[str] = "./.gemini_cache"):
         """
         Initialize the Gemini Chatbot
         
         Args:
             api_key: Your Gemini API key. If not provided, will look for GEMINI_API_KEY environment variable
+            semantic_cache: Cache used for paraphrased prompts. Defaults to a SemanticCache stored in
+                cache_dir, or kept in memory when cache_dir is None
+            cache_dir: Directory of the persistent caches; the response cache there requires diskcache
         """
         self.api_key = api_key or CONFIG_API_KEY or os.getenv('GEMINI_API_KEY')
         if not self.api_key:
             raise ValueError("API key is required. Set GEMINI_API_KEY in config.py, as environment variable, or pass api_key parameter")
         
-        # Use a public Generative Language model endpoint by default.
-        # If you have access to Gemini models, replace this with the proper endpoint
-        # and use service-account authentication if required.
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta2/models/text-bison-001:generate"
+        # Gemini generateContent endpoint of the Generative Language API.
+        # Replace the model name to use a different Gemini model, and use
+        # service-account authentication if required.
+        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
         self.headers = {
             'Content-Type': 'application/json'
         }
+        self.embed_url = "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent"
+        
+        # One multiplexed HTTP/2 connection pool shared by every call from this chatbot
+        self.client = httpx.Client(
+            timeout=30.0,
+            headers=self.headers,
+            transport=httpx.HTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+            )
+        )
+        
+        # Async connection pools are bound to the loop that opened them, so each
+        # running event loop gets its own client (see _async_client)
+        self._aclients = {}
         
-        # Chat history for context
-        self.chat_history = []
+        # Checking for the local model loads it now, not on the first message
+        self._use_embedder(local=_embedder() is not None)
+        if semantic_cache is None:
+            semantic_path = ":memory:"
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+                semantic_path = os.path.join(cache_dir, "semantic.sqlite3")
+            semantic_cache = SemanticCache(semantic_path)
+        self.semantic_cache = semantic_cache
+        
+        # Conversations replayed after a restart are answered from disk
+        self.disk_cache = diskcache.Cache(cache_dir) if diskcache is not None and cache_dir else None
+        
+        # Chat history for context, plus the same turns pre-built in request format
+        self.chat_history = deque(maxlen=self.history_limit)
+        self._history_contents = deque(maxlen=self.history_limit)
+        
+        # Entries evicted from the history but not yet folded into the summary.
+        # Summarizing runs in a background thread, one compaction at a time; the
+        # epoch changes on clear_history so a late summary is discarded.
+        self._unsummarized = []
+        self._compaction_lock = threading.Lock()
+        self._compacting = False
+        self._history_epoch = 0
+        
+        # Parts of the generateContent payload that only change with the summary
+        self._set_summary("")
     
-    def send_message(self, message: str) -> str:
+    def send_message(self, message: str, no_cache: bool = False) -> str:
         """
         Send a message to the Gemini API and return the response
         
         Args:
             message: The user's message
+            no_cache: Skip the response cache (neither read nor stored), e.g. for sensitive prompts
             
         Returns:
             The AI's response
         """
+        if no_cache:
+            text, ok = self._send_message_uncached(message)
+            if ok:
+                self._record_turn(message, text)
+                self._schedule_compaction()
+            return text
+
+        key, cached = self._lookup_cached(message)
+        embedding = None
+        # Paraphrase matching ignores context, so it only applies to opening messages
+        if cached is None and not self.chat_history:
+            embedding = self._embed(message)
+            cached = self._lookup_semantic(key, embedding)
+        if cached is not None:
+            self._record_turn(message, cached)
+            self._schedule_compaction()
+            return cached
+
+        text, ok = self._send_message_uncached(message)
+        if ok:
+            self._store_response(message, key, embedding, text)
+            self._schedule_compaction()
+        return text
+
+    async def send_message_async(self, message: str, no_cache: bool = False) -> str:
+        """
+        Asynchronous version of send_message using the shared httpx.AsyncClient
+        
+        Args:
+            message: The user's message
+            no_cache: Skip the response cache (neither read nor stored), e.g. for sensitive prompts
+            
+        Returns:
+            The AI's response
+        """
+        if no_cache:
+            text, ok = await self._send_message_uncached_async(message)
+            if ok:
+                self._record_turn(message, text)
+                self._schedule_compaction()
+            return text
+
+        key, cached = self._lookup_cached(message)
+        embedding = None
+        # Paraphrase matching ignores context, so it only applies to opening messages
+        if cached is None and not self.chat_history:
+            embedding = await self._embed_async(message)
+            cached = self._lookup_semantic(key, embedding)
+        if cached is not None:
+            self._record_turn(message, cached)
+            self._schedule_compaction()
+            return cached
+
+        text, ok = await self._send_message_uncached_async(message)
+        if ok:
+            self._store_response(message, key, embedding, text)
+            self._schedule_compaction()
+        return text
+
+    def _lookup_cached(self, message: str) -> Tuple[str, Optional[str]]:
+        """
+        Check the in-memory and persistent caches for a message
+        
+        Returns:
+            A (key, cached) tuple; cached is None on a miss
+        """
+        key = self._state_key(message)
+        cached = self._cache_get(key)
+        if cached is None and self.disk_cache is not None:
+            cached = self.disk_cache.get(key)
+            if cached is not None:
+                self._cache_put(key, cached)
+        return key, cached
+
+    def _lookup_semantic(self, key: str, embedding: Optional[List[float]]) -> Optional[str]:
+        """Return the semantic cache answer for a prompt embedding, if one is close enough"""
+        if embedding is None:
+            return None
+        matches = self.semantic_cache.query(self.cache_namespace, embedding, top_k=1)
+        if matches and matches[0][0] >= self.similarity_threshold:
+            self._cache_put(key, matches[0][1])
+            return matches[0][1]
+        return None
+
+    def _store_response(self, message: str, key: str, embedding: Optional[List[float]], text: str):
+        """Populate every cache tier with a fresh response and record the turn"""
+        self._cache_put(key, text)
+        if self.disk_cache is not None:
+            self.disk_cache.set(key, text, expire=self.disk_cache_ttl)
+        if embedding is not None:
+            self.semantic_cache.insert(self.cache_namespace, embedding, text, ttl=self.semantic_cache_ttl)
+        self._record_turn(message, text)
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Look up an exact-match cached response"""
+        with self._cache_lock:
+            cached = self._response_cache.get(key)
+            if cached is not None:
+                self._response_cache.move_to_end(key)
+            return cached
+
+    def _cache_put(self, key: str, text: str):
+        """Store an exact-match response, evicting the least recently used entries"""
+        with self._cache_lock:
+            self._response_cache[key] = text
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self.cache_size:
+                self._response_cache.popitem(last=False)
+
+    def _embed_payload(self, text: str) -> dict:
+        """Build the embedContent request body for a prompt"""
+        return {"content": {"parts": [{"text": text}]}}
+
+    @staticmethod
+    def _parse_embedding(response: httpx.Response) -> Optional[List[float]]:
+        """Extract the embedding values from an embedContent response"""
+        if response.status_code >= 400:
+            return None
+        return response.json()["embedding"]["values"]
+
+    def _use_embedder(self, local: bool):
+        """Select the local or API embedder; semantic cache entries are namespaced per API key and embedder"""
+        self.use_local_embedder = local
+        embedder_id = os.path.abspath(EMBED_MODEL_DIR) if local else self.embed_url
+        self.cache_namespace = hashlib.sha256(f"{self.api_key}\0{embedder_id}".encode()).hexdigest()[:16]
+
+    def _embed(self, text: str) -> Optional[List[float]]:
+        """
+        Embed a prompt for the semantic cache
+        
+        Returns:
+            The embedding values, or None if no embedder is available
+        """
+        if self.use_local_embedder:
+            embedding = _local_embed(text)
+            if embedding is not None:
+                return embedding
+            # The local model failed; use the API embedder from now on
+            self._use_embedder(local=False)
         try:
-            # Prepare the request payload using the public generate format
-            payload = {
-                "prompt": {"text": message},
-                "temperature": 0.2
-            }
+            return self._parse_embedding(self._post(self.embed_url, self._embed_payload(text), timeout=10))
+        except (httpx.HTTPError, ValueError, KeyError, TypeError):
+            return None
 
-            # Send API key as query parameter (server-side). If you use a service account,
-            # replace this with an OAuth Bearer token in the Authorization header.
-            response = requests.post(
-                f"{self.base_url}?key={self.api_key}",
+    async def _embed_async(self, text: str) -> Optional[List[float]]:
+        """Asynchronous version of _embed"""
+        if self.use_local_embedder:
+            embedding = _local_embed(text)
+            if embedding is not None:
+                return embedding
+            self._use_embedder(local=False)
+        try:
+            return self._parse_embedding(await self._post_async(self.embed_url, self._embed_payload(text), timeout=10))
+        except (httpx.HTTPError, ValueError, KeyError, TypeError):
+            return None
+
+    def _state_key(self, message: str) -> str:
+        """Build the cache key from the conversation so far plus the new message"""
+        state = {
+            "system": STATIC_SYSTEM_PROMPT,
+            "summary": self._summary,
+            "history": list(self.chat_history),
+            "q": message,
+            "model": self.base_url
+        }
+        return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+    def _record_turn(self, message: str, response: str):
+        """Append a user/assistant exchange to the chat history"""
+        if len(self.chat_history) + 2 > self.history_limit:
+            self._evict_oldest()
+        message = message[:self.max_turn_chars]
+        response = response[:self.max_turn_chars]
+        self.chat_history.append({"role": "user", "content": message})
+        self.chat_history.append({"role": "assistant", "content": response})
+        self._history_contents.append({"role": "user", "parts": [{"text": message}]})
+        self._history_contents.append({"role": "model", "parts": [{"text": response}]})
+
+    def _evict_oldest(self):
+        """Move the oldest history entries to the queue awaiting summarization"""
+        with self._compaction_lock:
+            for _ in range(min(self.summary_batch, len(self.chat_history))):
+                self._unsummarized.append(self.chat_history.popleft())
+                self._history_contents.popleft()
+
+    def _schedule_compaction(self):
+        """
+        Summarize evicted history in a background thread, off the reply path
+        
+        Also used by send_message_async: a task would be cancelled along with a
+        short-lived event loop, such as the one per request of Flask async views.
+        """
+        if self._unsummarized and not self._compacting:
+            threading.Thread(target=self._compact_history, daemon=True).start()
+
+    def _claim_unsummarized(self) -> Optional[Tuple[List[dict], dict, int]]:
+        """
+        Take the evicted entries for summarization, unless a compaction is already running
+        
+        Returns:
+            An (entries, summary request payload, history epoch) tuple, or None if there is nothing to do
+        """
+        with self._compaction_lock:
+            if self._compacting or not self._unsummarized:
+                return None
+            self._compacting = True
+            evicted, self._unsummarized = self._unsummarized, []
+
+        transcript = "\n".join(
+            f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}" for turn in evicted
+        )
+        prompt = (
+            "Update the summary of an ongoing conversation with the new exchanges below. "
+            "Keep facts, names and decisions the assistant may need later; reply with the summary only.\n\n"
+            f"Current summary:\n{self._summary or '(none)'}\n\nNew exchanges:\n{transcript}"
+        )
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        return evicted, payload, self._history_epoch
+
+    def _finish_compaction(self, evicted: List[dict], epoch: int, summary: Optional[str]):
+        """
+        Store a new summary and release the claim
+        
+        Without a summary the entries are queued again for the next attempt, keeping
+        at most history_limit of them. Nothing is kept if the history was cleared meanwhile.
+        """
+        with self._compaction_lock:
+            if epoch == self._history_epoch:
+                if summary is not None:
+                    self._set_summary(summary[:self.max_turn_chars])
+                else:
+                    self._unsummarized[:0] = evicted
+                    del self._unsummarized[:-self.history_limit]
+            self._compacting = False
+
+    def _compact_history(self):
+        """Fold evicted history entries into the running conversation summary"""
+        claimed = self._claim_unsummarized()
+        while claimed is not None:
+            evicted, payload, epoch = claimed
+            summary = None
+            try:
+                text, ok = self._parse_response(self._post(self.base_url, payload))
+                if ok:
+                    summary = text
+            except Exception:
+                pass
+            finally:
+                self._finish_compaction(evicted, epoch, summary)
+            if summary is None:
+                # Retried after the next turn rather than hammering a failing API
+                return
+            claimed = self._claim_unsummarized()
+
+    def _set_summary(self, summary: str):
+        """Store the conversation summary and rebuild the static payload around it"""
+        self._summary = summary
+        parts = [{"text": STATIC_SYSTEM_PROMPT}]
+        if summary:
+            # After the static prompt, so the byte-identical prefix is preserved
+            parts.append({"text": f"Summary of the earlier conversation:\n{summary}"})
+        self._payload_base = {
+            "systemInstruction": {"parts": parts},
+            "generationConfig": {"temperature": 0.2}
+        }
+
+    @staticmethod
+    def _encode(payload: dict) -> dict:
+        """Serialize a JSON body once, with orjson when available"""
+        if orjson is not None:
+            # The client's default headers already declare application/json
+            return {"content": orjson.dumps(payload)}
+        return {"json": payload}
+
+    def _post(self, url: str, payload: dict, timeout: float = 30.0) -> httpx.Response:
+        """POST a JSON payload, retrying transient error statuses"""
+        for attempt in range(self.max_retries + 1):
+            response = self.client.post(url, params={"key": self.api_key}, timeout=timeout, **self._encode(payload))
+            if response.status_code not in self.retry_statuses or attempt == self.max_retries:
+                return response
+            time.sleep(self.retry_backoff * (2 ** attempt))
+        return response
+
+    async def _async_client(self) -> httpx.AsyncClient:
+        """
+        Return the AsyncClient of the running event loop, creating it on first use
+        
+        A loop per call, as with asyncio.run or Flask async views, would otherwise
+        reuse connections of a closed loop. The client is closed and dropped by the
+        loop's shutdown_asyncgens(), which asyncio.run calls before closing the loop.
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._aclients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(
+                timeout=30.0,
                 headers=self.headers,
-                json=payload,
-                timeout=30
+                transport=httpx.AsyncHTTPTransport(
+                    http2=True,
+                    retries=2,
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+                )
             )
+            closer = self._close_at_loop_shutdown(loop, client)
+            await closer.__anext__()
+            entry = self._aclients[loop] = (client, closer)
+        return entry[0]
 
-            # If the remote API returns an error status, return its status/body for diagnostics
-            if response.status_code >= 400:
-                return f"Remote API error: {response.status_code} - {response.text}"
+    async def _close_at_loop_shutdown(self, loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient):
+        """Async generator, held open until the loop shuts down its async generators"""
+        try:
+            yield
+        finally:
+            self._aclients.pop(loop, None)
+            await client.aclose()
 
-            # Parse the response
-            response_data = response.json()
+    async def _post_async(self, url: str, payload: dict, timeout: float = 30.0) -> httpx.Response:
+        """Asynchronous version of _post"""
+        client = await self._async_client()
+        for attempt in range(self.max_retries + 1):
+            response = await client.post(url, params={"key": self.api_key}, timeout=timeout, **self._encode(payload))
+            if response.status_code not in self.retry_statuses or attempt == self.max_retries:
+                return response
+            await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+        return response
 
-            # Try common response shapes; fallback to stringified response
-            generated_text = None
-            if isinstance(response_data, dict):
-                if 'candidates' in response_data and len(response_data['candidates']) > 0:
-                    candidate = response_data['candidates'][0]
-                    for key in ('output', 'content', 'text'):
-                        if key in candidate:
-                            generated_text = candidate.get(key) if isinstance(candidate.get(key), str) else str(candidate.get(key))
-                if not generated_text and 'output' in response_data:
-                    out = response_data['output']
-                    if isinstance(out, list) and len(out) > 0:
-                        generated_text = out[0].get('content', out[0].get('text', str(out[0]))) if isinstance(out[0], dict) else str(out[0])
-                if not generated_text and 'text' in response_data:
-                    generated_text = response_data['text']
-
-            if generated_text:
-                self.chat_history.append({"role": "user", "content": message})
-                self.chat_history.append({"role": "assistant", "content": generated_text})
-                return generated_text
-
-            return json.dumps(response_data)
+    def _build_payload(self, message: str) -> dict:
+        """
+        Prepare the generateContent payload
+        
+        The static system prompt and the earlier turns come first so consecutive
+        requests share the longest possible prefix; only the new message differs.
+        """
+        contents = [*self._history_contents, {"role": "user", "parts": [{"text": message}]}]
+        return {**self._payload_base, "contents": contents}
+
+    def _send_message_uncached(self, message: str) -> Tuple[str, bool]:
+        """
+        Call the remote API for a message
+        
+        Args:
+            message: The user's message
             
-        except requests.exceptions.RequestException as e:
-            return f"Error connecting to API: {str(e)}"
+        Returns:
+            A (text, ok) tuple; ok is False when text is an error description
+        """
+        try:
+            # Send API key as query parameter (server-side). If you use a service account,
+            # replace this with an OAuth Bearer token in the Authorization header.
+            response = self._post(self.base_url, self._build_payload(message))
+            return self._parse_response(response)
+        except httpx.HTTPError as e:
+            return f"Error connecting to API: {str(e)}", False
         except json.JSONDecodeError:
-            return "Error parsing API response. Please try again."
+            return "Error parsing API response. Please try again.", False
         except Exception as e:
-            return f"An unexpected error occurred: {str(e)}"
+            return f"An unexpected error occurred: {str(e)}", False
+
+    async def _send_message_uncached_async(self, message: str) -> Tuple[str, bool]:
+        """Asynchronous version of _send_message_uncached"""
+        try:
+            response = await self._post_async(self.base_url, self._build_payload(message))
+            return self._parse_response(response)
+        except httpx.HTTPError as e:
+            return f"Error connecting to API: {str(e)}", False
+        except json.JSONDecodeError:
+            return "Error parsing API response. Please try again.", False
+        except Exception as e:
+            return f"An unexpected error occurred: {str(e)}", False
+
+    @staticmethod
+    def _parse_response(response: httpx.Response) -> Tuple[str, bool]:
+        """Extract the generated text from an API response as a (text, ok) tuple"""
+        # If the remote API returns an error status, return its status/body for diagnostics
+        if response.status_code >= 400:
+            return f"Remote API error: {response.status_code} - {response.text}", False
+
+        # Parse the response
+        response_data = response.json()
+
+        # Try common response shapes; fallback to stringified response
+        generated_text = None
+        if isinstance(response_data, dict):
+            if 'candidates' in response_data and len(response_data['candidates']) > 0:
+                candidate = response_data['candidates'][0]
+                content = candidate.get('content')
+                if isinstance(content, dict):
+                    generated_text = "".join(part.get('text', '') for part in content.get('parts', []))
+                else:
+                    for key in ('output', 'content', 'text'):
+                        if key in candidate:
+                            generated_text = candidate.get(key) if isinstance(candidate.get(key), str) else str(candidate.get(key))
+            if not generated_text and 'output' in response_data:
+                out = response_data['output']
+                if isinstance(out, list) and len(out) > 0:
+                    generated_text = out[0].get('content', out[0].get('text', str(out[0]))) if isinstance(out[0], dict) else str(out[0])
+            if not generated_text and 'text' in response_data:
+                generated_text = response_data['text']
+
+        if generated_text:
+            return generated_text, True
+
+        return json.dumps(response_data), False
     
     def clear_history(self):
         """Clear the chat history"""
-        self.chat_history = []
+        with self._compaction_lock:
+            self.chat_history.clear()
+            self._history_contents.clear()
+            self._unsummarized.clear()
+            self._history_epoch += 1
+            self._set_summary("")
+    
+    def clear_cache(self):
+        """Clear the cached responses"""
+        with self._cache_lock:
+            self._response_cache.clear()
+        self.semantic_cache.clear(self.cache_namespace)
+        if self.disk_cache is not None:
+            self.disk_cache.clear()
     
     def get_history(self):
         """Get the current chat history"""
-        return self.chat_history
+        return list(self.chat_history)
 
 def main():
     """Main function to run the chatbot interactively"""
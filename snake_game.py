@@ -1,6 +1,7 @@
 import pygame
 import random
 import sys
+from collections import deque
 
 # Initialize pygame
 pygame.init()
@@ -12,6 +13,22 @@ GRID_SIZE = 20
 GRID_WIDTH = WINDOW_WIDTH // GRID_SIZE
 GRID_HEIGHT = WINDOW_HEIGHT // GRID_SIZE
 
+# The snake advances at a fixed 10 steps per second, while input and drawing
+# run at the display rate so key presses are picked up without waiting a step
+SIM_STEP_MS = 100
+RENDER_FPS = 60
+
+# The only events the game reacts to. Exposure forces a full redraw, since
+# frames otherwise only repaint the cells that changed.
+HANDLED_EVENTS = (pygame.QUIT, pygame.KEYDOWN, pygame.VIDEOEXPOSE)
+
+# Cells are stored as flat indices, cell = y * GRID_WIDTH + x
+GRID_CELLS = GRID_WIDTH * GRID_HEIGHT
+
+# Screen rectangle of every grid cell, indexed by cell
+CELL_RECTS = [pygame.Rect(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE)
+              for y in range(GRID_HEIGHT) for x in range(GRID_WIDTH)]
+
 # Colors
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -20,91 +37,177 @@ RED = (255, 0, 0)
 BLUE = (0, 0, 255)
 DARK_GREEN = (0, 150, 0)
 
-# Directions
-UP = (0, -1)
-DOWN = (0, 1)
-LEFT = (-1, 0)
-RIGHT = (1, 0)
+# Snake segment pre-rendered with its border, so each segment is a single blit
+SEGMENT_SURF = pygame.Surface((GRID_SIZE, GRID_SIZE))
+SEGMENT_SURF.fill(GREEN)
+pygame.draw.rect(SEGMENT_SURF, DARK_GREEN, SEGMENT_SURF.get_rect(), 1)
+
+# Food pre-rendered the same way
+FOOD_SURF = pygame.Surface((GRID_SIZE, GRID_SIZE))
+FOOD_SURF.fill(RED)
+pygame.draw.rect(FOOD_SURF, WHITE, FOOD_SURF.get_rect(), 1)
+
+# Directions, as indices into the per-direction tables below
+UP, DOWN, LEFT, RIGHT = 0, 1, 2, 3
+DX = (0, 0, -1, 1)
+DY = (-1, 1, 0, 0)
+OPPOSITE = (DOWN, UP, RIGHT, LEFT)
+
+def _neighbors(dx, dy):
+    # Cell reached from each cell by one step in (dx, dy), or -1 past a wall
+    return tuple((y + dy) * GRID_WIDTH + x + dx
+                 if 0 <= x + dx < GRID_WIDTH and 0 <= y + dy < GRID_HEIGHT else -1
+                 for y in range(GRID_HEIGHT) for x in range(GRID_WIDTH))
+
+# Precomputed step table, so a move is a single lookup instead of arithmetic
+# plus four bounds comparisons: NEIGHBORS[direction][cell]
+NEIGHBORS = tuple(_neighbors(DX[d], DY[d]) for d in (UP, DOWN, LEFT, RIGHT))
 
 class Snake:
     def __init__(self):
-        self.body = [(GRID_WIDTH // 2, GRID_HEIGHT // 2)]
+        self.body = deque([(GRID_HEIGHT // 2) * GRID_WIDTH + GRID_WIDTH // 2])
+        # Occupancy flag per cell, mirroring body for O(1) membership tests
+        self.occupied = bytearray(GRID_CELLS)
+        self.occupied[self.body[0]] = 1
         self.direction = RIGHT
+        self.heading = RIGHT  # Direction of the last move actually made
         self.grow = False
+        self.vacated = None  # Tail cell freed by the last move, if any
+        
+        # Cells not covered by the snake, plus each cell's index in that list,
+        # so cells can be added, removed and sampled in O(1)
+        self.free_cells = list(range(GRID_CELLS))
+        self._free_index = {cell: i for i, cell in enumerate(self.free_cells)}
+        self._occupy(self.body[0])
         
     def move(self):
-        head_x, head_y = self.body[0]
-        new_head = (head_x + self.direction[0], head_y + self.direction[1])
+        new_head = NEIGHBORS[self.direction][self.body[0]]
         
         # Check wall collision
-        if (new_head[0] < 0 or new_head[0] >= GRID_WIDTH or 
-            new_head[1] < 0 or new_head[1] >= GRID_HEIGHT):
+        if new_head < 0:
             return False
             
         # Check self collision
-        if new_head in self.body:
+        if self.occupied[new_head]:
             return False
             
-        self.body.insert(0, new_head)
+        self.heading = self.direction
+        self.body.appendleft(new_head)
+        self.occupied[new_head] = 1
+        self._occupy(new_head)
         
         if not self.grow:
-            self.body.pop()
+            self.vacated = self.body.pop()
+            self.occupied[self.vacated] = 0
+            self._vacate(self.vacated)
         else:
+            self.vacated = None
             self.grow = False
             
         return True
     
+    def _occupy(self, cell):
+        # Swap the cell with the last free cell and drop it from the end
+        i = self._free_index.pop(cell)
+        last = self.free_cells.pop()
+        if last != cell:
+            self.free_cells[i] = last
+            self._free_index[last] = i
+    
+    def _vacate(self, cell):
+        self._free_index[cell] = len(self.free_cells)
+        self.free_cells.append(cell)
+    
+    def random_free_cell(self):
+        # Uniformly pick a cell the snake does not cover, or None if the board is full
+        if not self.free_cells:
+            return None
+        return self.free_cells[random.randrange(len(self.free_cells))]
+    
     def change_direction(self, new_direction):
-        # Prevent the snake from going backwards into itself
-        if (self.direction[0] * -1, self.direction[1] * -1) != new_direction:
+        # Prevent the snake from going backwards into itself. Several keys can
+        # arrive within one step, so check against the last move, not the last key
+        if OPPOSITE[self.heading] != new_direction:
             self.direction = new_direction
     
     def eat_food(self):
         self.grow = True
     
-    def draw(self, screen):
-        for segment in self.body:
-            x, y = segment
-            rect = pygame.Rect(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE)
-            pygame.draw.rect(screen, GREEN, rect)
-            pygame.draw.rect(screen, DARK_GREEN, rect, 1)
+    def draw(self, screen, segment_surf=SEGMENT_SURF):
+        # Submit every segment to SDL in one call
+        screen.blits([(segment_surf, CELL_RECTS[cell]) for cell in self.body], doreturn=False)
 
 class Food:
-    def __init__(self):
-        self.position = self.generate_position()
+    def __init__(self, position=None):
+        self.position = position if position is not None else self.generate_position()
     
     def generate_position(self):
-        x = random.randint(0, GRID_WIDTH - 1)
-        y = random.randint(0, GRID_HEIGHT - 1)
-        return (x, y)
+        return random.randrange(GRID_CELLS)
     
-    def draw(self, screen):
-        x, y = self.position
-        rect = pygame.Rect(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE)
-        pygame.draw.rect(screen, RED, rect)
-        pygame.draw.rect(screen, WHITE, rect, 1)
+    def draw(self, screen, food_surf=FOOD_SURF):
+        screen.blit(food_surf, CELL_RECTS[self.position])
 
 class Game:
+    # Arrow key -> direction
+    _DIR_KEYS = {
+        pygame.K_UP: UP,
+        pygame.K_DOWN: DOWN,
+        pygame.K_LEFT: LEFT,
+        pygame.K_RIGHT: RIGHT
+    }
+    
     def __init__(self):
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("Snake Game")
+        
+        # Copies of the cell surfaces in the display's pixel format, so their
+        # blits are plain copies instead of per-pixel conversions
+        self.segment_surf = SEGMENT_SURF.convert()
+        self.food_surf = FOOD_SURF.convert()
+        
+        # Keep mouse motion and other unused events out of the queue entirely
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(HANDLED_EVENTS)
         self.clock = pygame.time.Clock()
         self.font = pygame.font.Font(None, 36)
         self.big_font = pygame.font.Font(None, 72)
+        
+        # Static text is rendered and positioned once; blitting it is cheap
+        center_x, center_y = WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2
+        self.pause_surf = self.big_font.render("PAUSED", True, WHITE)
+        self.pause_rect = self.pause_surf.get_rect(center=(center_x, center_y))
+        self.resume_surf = self.font.render("Press SPACE to resume", True, WHITE)
+        self.resume_rect = self.resume_surf.get_rect(center=(center_x, center_y + 50))
+        self.game_over_surf = self.big_font.render("GAME OVER!", True, RED)
+        self.game_over_rect = self.game_over_surf.get_rect(center=(center_x, center_y - 50))
+        self.restart_surf = self.font.render("Press SPACE to restart or ESC to quit", True, WHITE)
+        self.restart_rect = self.restart_surf.get_rect(center=(center_x, center_y + 50))
+        self.controls_surf = self.font.render("Controls: Arrow Keys to move, SPACE to pause, ESC to quit", True, WHITE)
+        self.controls_rect = self.controls_surf.get_rect(topleft=(10, WINDOW_HEIGHT - 30))
+        self._last_score = None
+        
+        # Cells changed since the last frame, and the screen areas to update
+        self._changed_cells = []
+        self._dirty = []
+        
         self.reset_game()
     
     def reset_game(self):
         self.snake = Snake()
-        self.food = Food()
+        self.food = Food(self.snake.random_free_cell())
         self.score = 0
         self.game_over = False
         self.paused = False
+        self._full_redraw = True
     
     def handle_events(self):
-        for event in pygame.event.get():
+        for event in pygame.event.get(HANDLED_EVENTS):
             if event.type == pygame.QUIT:
                 return False
             
+            if event.type == pygame.VIDEOEXPOSE:
+                self._full_redraw = True
+            
             if event.type == pygame.KEYDOWN:
                 if self.game_over:
                     if event.key == pygame.K_SPACE:
@@ -112,16 +215,12 @@ class Game:
                     elif event.key == pygame.K_ESCAPE:
                         return False
                 else:
-                    if event.key == pygame.K_UP:
-                        self.snake.change_direction(UP)
-                    elif event.key == pygame.K_DOWN:
-                        self.snake.change_direction(DOWN)
-                    elif event.key == pygame.K_LEFT:
-                        self.snake.change_direction(LEFT)
-                    elif event.key == pygame.K_RIGHT:
-                        self.snake.change_direction(RIGHT)
+                    direction = self._DIR_KEYS.get(event.key)
+                    if direction is not None:
+                        self.snake.change_direction(direction)
                     elif event.key == pygame.K_SPACE:
                         self.paused = not self.paused
+                        self._full_redraw = True
                     elif event.key == pygame.K_ESCAPE:
                         return False
         
@@ -131,65 +230,120 @@ class Game:
         if not self.game_over and not self.paused:
             if not self.snake.move():
                 self.game_over = True
+                self._full_redraw = True
                 return
             
+            # Only the new head and the freed tail cell change on screen
+            self._changed_cells.append(self.snake.body[0])
+            if self.snake.vacated is not None:
+                self._changed_cells.append(self.snake.vacated)
+            
             # Check if snake ate food
             if self.snake.body[0] == self.food.position:
                 self.snake.eat_food()
                 self.score += 10
-                self.food.position = self.food.generate_position()
+                self._full_redraw = True
                 
-                # Make sure food doesn't spawn on snake
-                while self.food.position in self.snake.body:
-                    self.food.position = self.food.generate_position()
+                # Spawn the food on a free cell; a full board ends the game
+                self.food.position = self.snake.random_free_cell()
+                if self.food.position is None:
+                    self.game_over = True
+    
+    def update_score_text(self):
+        # Re-render the score text only when the score has changed
+        if self.score != self._last_score:
+            self._last_score = self.score
+            self.score_surf = self.font.render(f"Score: {self.score}", True, WHITE)
+            self.final_score_surf = self.font.render(f"Final Score: {self.score}", True, WHITE)
+            self.final_score_rect = self.final_score_surf.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//2))
+            self.score_rect = self.score_surf.get_rect(topleft=(10, 10))
+    
+    def draw_cell(self, cell):
+        # Repaint one grid cell with the same layering as a full redraw
+        rect = CELL_RECTS[cell]
+        if self.snake.occupied[cell]:
+            self.screen.blit(self.segment_surf, rect)
+        else:
+            self.screen.fill(BLACK, rect)
+        if cell == self.food.position:
+            self.food.draw(self.screen, self.food_surf)
+        
+        # Restore the part of any HUD text lying over this cell
+        for surf, hud_rect in ((self.score_surf, self.score_rect), (self.controls_surf, self.controls_rect)):
+            if hud_rect.colliderect(rect):
+                self.screen.set_clip(rect)
+                self.screen.blit(surf, hud_rect)
+                self.screen.set_clip(None)
+        
+        self._dirty.append(rect)
     
     def draw(self):
+        self.update_score_text()
+        
+        if not self._full_redraw:
+            # Push only the cells that changed since the last frame
+            for cell in self._changed_cells:
+                self.draw_cell(cell)
+            self._changed_cells.clear()
+            if self._dirty:
+                pygame.display.update(self._dirty)
+                self._dirty.clear()
+            return
+        
+        self._full_redraw = False
+        self._changed_cells.clear()
+        self._dirty.clear()
         self.screen.fill(BLACK)
         
         if not self.game_over:
-            self.snake.draw(self.screen)
-            self.food.draw(self.screen)
+            self.snake.draw(self.screen, self.segment_surf)
+            self.food.draw(self.screen, self.food_surf)
             
             # Draw score
-            score_text = self.font.render(f"Score: {self.score}", True, WHITE)
-            self.screen.blit(score_text, (10, 10))
+            self.screen.blit(self.score_surf, self.score_rect)
             
             # Draw pause message
             if self.paused:
-                pause_text = self.big_font.render("PAUSED", True, WHITE)
-                pause_rect = pause_text.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//2))
-                self.screen.blit(pause_text, pause_rect)
-                
-                resume_text = self.font.render("Press SPACE to resume", True, WHITE)
-                resume_rect = resume_text.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//2 + 50))
-                self.screen.blit(resume_text, resume_rect)
+                self.screen.blit(self.pause_surf, self.pause_rect)
+                self.screen.blit(self.resume_surf, self.resume_rect)
         else:
             # Game over screen
-            game_over_text = self.big_font.render("GAME OVER!", True, RED)
-            game_over_rect = game_over_text.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//2 - 50))
-            self.screen.blit(game_over_text, game_over_rect)
-            
-            score_text = self.font.render(f"Final Score: {self.score}", True, WHITE)
-            score_rect = score_text.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//2))
-            self.screen.blit(score_text, score_rect)
-            
-            restart_text = self.font.render("Press SPACE to restart or ESC to quit", True, WHITE)
-            restart_rect = restart_text.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//2 + 50))
-            self.screen.blit(restart_text, restart_rect)
+            self.screen.blit(self.game_over_surf, self.game_over_rect)
+            self.screen.blit(self.final_score_surf, self.final_score_rect)
+            self.screen.blit(self.restart_surf, self.restart_rect)
         
         # Draw controls
-        controls_text = self.font.render("Controls: Arrow Keys to move, SPACE to pause, ESC to quit", True, WHITE)
-        self.screen.blit(controls_text, (10, WINDOW_HEIGHT - 30))
+        self.screen.blit(self.controls_surf, self.controls_rect)
         
         pygame.display.flip()
     
     def run(self):
+        # Bind per-frame calls to locals to skip attribute lookups in the loop
+        handle_events = self.handle_events
+        update = self.update
+        draw = self.draw
+        tick = self.clock.tick
+        get_ticks = pygame.time.get_ticks
+        
         running = True
+        previous = get_ticks()
+        lag = 0
         while running:
-            running = self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(10)  # 10 FPS for smooth gameplay
+            now = get_ticks()
+            lag += now - previous
+            previous = now
+            
+            # Input every frame; the snake moves once per elapsed SIM_STEP_MS.
+            # At most one step per frame: whole steps missed during a stall are
+            # dropped rather than replayed unseen, only the fraction is kept.
+            running = handle_events()
+            if lag >= SIM_STEP_MS:
+                update()
+                lag %= SIM_STEP_MS
+            
+            # Frames without a step have no changed cells and update nothing
+            draw()
+            tick(RENDER_FPS)
         
         pygame.quit()
         sys.exit()
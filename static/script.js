@@ -108,8 +108,8 @@ class ChatApp {
         this.setStatus('typing', 'AI is typing...');
         
         try {
-            // Send to backend
-            const response = await fetch('/api/chat', {
+            // Send to backend and render the reply as it streams in
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -121,20 +121,57 @@ class ChatApp {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
-            const data = await response.json();
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let fullText = '';
+            let messageText = null;
             
-            // Hide typing indicator
-            this.hideTypingIndicator();
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                
+                // Server-sent events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    
+                    let eventType = 'message';
+                    let data = '';
+                    for (const line of rawEvent.split('\n')) {
+                        if (line.startsWith('event: ')) eventType = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    }
+                    const payload = data ? JSON.parse(data) : {};
+                    
+                    if (eventType === 'error') {
+                        throw new Error(payload.error || 'Unknown error occurred');
+                    }
+                    if (eventType === 'message' && payload.text) {
+                        fullText += payload.text;
+                        if (!messageText) {
+                            // Swap the typing indicator for the reply once the first chunk arrives,
+                            // but keep input locked until the stream finishes
+                            this.typingIndicator.classList.remove('show');
+                            messageText = this.addMessage(fullText, 'bot');
+                        } else {
+                            messageText.innerHTML = this.formatMessageText(fullText);
+                            this.scrollToBottom();
+                        }
+                    }
+                }
+            }
             
-            if (data.success) {
-                // Add bot response to chat
-                this.addMessage(data.response, 'bot');
-                this.lastBotMessage = data.response;
-                this.setStatus('ready', 'Ready');
-            } else {
-                throw new Error(data.error || 'Unknown error occurred');
+            if (!messageText) {
+                throw new Error('Empty response from server');
             }
             
+            this.hideTypingIndicator();
+            this.lastBotMessage = fullText;
+            this.setStatus('ready', 'Ready');
+            
         } catch (error) {
             console.error('Error:', error);
             this.hideTypingIndicator();
@@ -273,6 +310,7 @@ class ChatApp {
         
         this.chatMessages.appendChild(messageDiv);
         this.scrollToBottom();
+        return messageText;
     }
     
     showTypingIndicator() {
@@ -0,0 +1,9 @@
+# WSGI entry point for production servers
+# Run with: gunicorn -k gevent -w 4 --worker-connections 1000 -b 0.0.0.0:5000 wsgi:application
+
+# Patch the standard library before anything else imports sockets or threads,
+# so outgoing Gemini calls yield to other requests instead of blocking a worker
+from gevent import monkey
+monkey.patch_all()
+
+from app import app as application